@@ -1,14 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.core.process_pool import shutdown_process_pool
+from app.services.ai_service import get_ai_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The Gemini client keeps one multiplexed channel open for the whole process;
+    # close it only if a request ever created the service.
+    if get_ai_service.cache_info().currsize:
+        await get_ai_service().aclose()
+    shutdown_process_pool()
+
 
 def create_app():
-    app=FastAPI()
+    app=FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
+        allow_origins=settings.ALLOWED_ORIGINS,
+        allow_origin_regex=settings.ALLOWED_ORIGIN_REGEX,
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
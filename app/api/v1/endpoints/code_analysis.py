@@ -1,19 +1,103 @@
 import logging
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, Dict, Any, Tuple
+from cachetools import LRUCache
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.core.hashing import cache_key
+from app.core.process_pool import run_in_pool
 from app.models.ai_response import AIResponse
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, get_ai_service
 from app.services.code_service import CodeService
+from app.services.streaming import encode_sse
 from app.models.code_analysis_request import CodeAnalysisRequest
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-ai_service = AIService()
 code_service = CodeService()
 
+_analysis_cache: LRUCache = LRUCache(maxsize=256)
 
-@router.post("/analyze", response_model=AIResponse)
-async def analyze_code(request: CodeAnalysisRequest):
+
+async def _analyze_cached(
+    code_hash: bytes, code: str
+) -> Tuple[Dict[str, Any], str, str]:
+    """
+    Parse, analyze and refactor `code`, reusing previous results for the same source.
+
+    Entries are keyed on the source digest only, so the cache never holds on to
+    the submitted code strings themselves. Misses are computed in a worker
+    process so large modules do not stall the event loop.
+    """
+    cached = _analysis_cache.get(code_hash)
+    if cached is not None:
+        return cached
+
+    result = await run_in_pool(code_service.analyze_source, code)
+    _analysis_cache[code_hash] = result
+    return result
+
+
+async def _build_enhanced_context(request: CodeAnalysisRequest) -> Dict[str, Any]:
+    code_hash = cache_key(request.code)
+    code_analysis, optimized_code, formatted_code = await _analyze_cached(
+        code_hash, request.code
+    )
+
+    enhanced_context = {
+        "user_context": request.context,
+        "code_analysis": {
+            "structure": {
+                key: code_analysis[key]
+                for key in ("imports", "functions", "classes", "complexity")
+            },
+            "metrics": {
+                "total_imports": len(code_analysis["imports"]),
+                "total_functions": len(code_analysis["functions"]),
+                "total_classes": len(code_analysis["classes"]),
+                "complexity": code_analysis["complexity"],
+            },
+            "improvements": {
+                "optimized_imports": optimized_code != request.code,
+                "formatting_changes": formatted_code != request.code,
+            },
+        },
+    }
+
+    if code_analysis["functions_by_name"]:
+        enhanced_context["code_analysis"]["function_details"] = code_analysis[
+            "functions_by_name"
+        ]
+
+    if code_analysis["classes_by_name"]:
+        enhanced_context["code_analysis"]["class_details"] = code_analysis[
+            "classes_by_name"
+        ]
+
+    return enhanced_context
+
+
+async def _stream_events(
+    request: CodeAnalysisRequest, ai_service: AIService
+) -> AsyncIterator[Dict[str, Any]]:
+    try:
+        return ai_service.stream_analyze_code(
+            code=request.code,
+            context=await _build_enhanced_context(request),
+            user_prompt=request.user_prompt,
+        )
+    except Exception as code_error:
+        logger.error("Code analysis failed: %s", code_error)
+        return ai_service.stream_analyze_code(
+            code=request.code,
+            context=request.context,
+            user_prompt=request.user_prompt,
+        )
+
+
+@router.post("/analyze", response_model=None, responses={200: {"model": AIResponse}})
+async def analyze_code(
+    request: CodeAnalysisRequest, ai_service: AIService = Depends(get_ai_service)
+):
     try:
         logger.info("Starting code analysis")
 
@@ -21,48 +105,7 @@ async def analyze_code(request: CodeAnalysisRequest):
             raise HTTPException(status_code=400, detail="No code provided for analysis")
 
         try:
-            ast_tree = code_service.parse_code(request.code)
-            code_analysis = code_service.analyze_structure(ast_tree)
-
-            optimized_code = code_service.refactor_code(
-                request.code, "optimize_imports"
-            )
-            formatted_code = code_service.refactor_code(optimized_code, "format")
-
-            enhanced_context = {
-                "user_context": request.context,
-                "code_analysis": {
-                    "structure": code_analysis,
-                    "metrics": {
-                        "total_imports": len(code_analysis["imports"]),
-                        "total_functions": len(code_analysis["functions"]),
-                        "total_classes": len(code_analysis["classes"]),
-                        "complexity": code_analysis["complexity"],
-                    },
-                    "improvements": {
-                        "optimized_imports": optimized_code != request.code,
-                        "formatting_changes": formatted_code != request.code,
-                    },
-                },
-            }
-
-            if code_analysis["functions"]:
-                enhanced_context["code_analysis"]["function_details"] = {
-                    func["name"]: {
-                        "argument_count": func["args"],
-                        "line_number": func["line_number"],
-                    }
-                    for func in code_analysis["functions"]
-                }
-
-            if code_analysis["classes"]:
-                enhanced_context["code_analysis"]["class_details"] = {
-                    cls["name"]: {
-                        "method_count": cls["methods"],
-                        "line_number": cls["line_number"],
-                    }
-                    for cls in code_analysis["classes"]
-                }
+            enhanced_context = await _build_enhanced_context(request)
 
             response = await ai_service.analyze_code(
                 code=request.code,
@@ -78,7 +121,7 @@ async def analyze_code(request: CodeAnalysisRequest):
             return response
 
         except Exception as code_error:
-            logger.error(f"Code analysis failed: {str(code_error)}")
+            logger.error("Code analysis failed: %s", code_error)
             response = await ai_service.analyze_code(
                 code=request.code,
                 context=request.context,
@@ -92,3 +135,14 @@ async def analyze_code(request: CodeAnalysisRequest):
         error_msg = f"Error analyzing code: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
+
+
+@router.post("/analyze/stream")
+async def stream_analyze_code(
+    request: CodeAnalysisRequest, ai_service: AIService = Depends(get_ai_service)
+):
+    if not request.code or not request.code.strip():
+        raise HTTPException(status_code=400, detail="No code provided for analysis")
+
+    events = await _stream_events(request, ai_service)
+    return StreamingResponse(encode_sse(events), media_type="text/event-stream")
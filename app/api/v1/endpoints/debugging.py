@@ -1,67 +1,94 @@
 import os
-from typing import Optional
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models.ai_response import AIResponse
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, get_ai_service
 from app.services.log_service import LogService
+from app.services.streaming import encode_sse
 from app.models.log_analysis_request import LogAnalysisRequest
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-ai_service = AIService()
 log_service = LogService()
 
 
+def _read_log_file_sync(file_path: str) -> Optional[str]:
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
 async def read_log_file(file_path: str) -> Optional[str]:
-    """Safely read log file contents."""
+    """Safely read log file contents in a worker thread, off the event loop."""
     try:
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
-        return None
+        return await asyncio.to_thread(_read_log_file_sync, file_path)
     except Exception as e:
         return None
 
 
-@router.post("/debug", response_model=AIResponse)
-async def debug_logs(request: LogAnalysisRequest):
+async def _load_logs(request: LogAnalysisRequest) -> str:
+    logs = request.logs
+    if isinstance(logs, str) and await asyncio.to_thread(os.path.exists, logs):
+        file_content = await read_log_file(logs)
+        if file_content:
+            logs = file_content
+        else:
+            raise HTTPException(
+                status_code=400, detail="Unable to read log file or file is empty"
+            )
+
+    if not logs or not logs.strip():
+        raise HTTPException(status_code=400, detail="No logs provided for analysis")
+    return logs
+
+
+async def _build_enhanced_context(
+    request: LogAnalysisRequest, logs: str
+) -> Dict[str, Any]:
+    log_analysis = await asyncio.to_thread(log_service.analyze_logs, logs)
+
+    return {
+        "user_context": request.context,
+        "log_analysis": {
+            "total_entries": log_analysis["total_entries"],
+            "error_count": log_analysis["error_count"],
+            "error_rate": log_analysis["summary"]["error_rate"],
+            "level_distribution": log_analysis["summary"]["level_distribution"],
+            "detected_errors": log_service.trim_errors(log_analysis["errors"]),
+        },
+    }
+
+
+async def _stream_events(
+    request: LogAnalysisRequest, logs: str, ai_service: AIService
+) -> AsyncIterator[Dict[str, Any]]:
+    prompt_logs = log_service.trim_logs(logs)
     try:
-        logs = request.logs
-        if isinstance(logs, str) and os.path.exists(logs):
-            file_content = await read_log_file(logs)
-            if file_content:
-                logs = file_content
-            else:
-                raise HTTPException(
-                    status_code=400, detail="Unable to read log file or file is empty"
-                )
+        return ai_service.stream_analyze_logs(
+            logs=prompt_logs, context=await _build_enhanced_context(request, logs)
+        )
+    except Exception as log_error:
+        logger.error("Log analysis failed: %s", log_error)
+        return ai_service.stream_analyze_logs(logs=prompt_logs, context=request.context)
 
-        if not logs or not logs.strip():
-            raise HTTPException(status_code=400, detail="No logs provided for analysis")
+
+@router.post("/debug", response_model=None, responses={200: {"model": AIResponse}})
+async def debug_logs(
+    request: LogAnalysisRequest, ai_service: AIService = Depends(get_ai_service)
+):
+    try:
+        logs = await _load_logs(request)
+        prompt_logs = log_service.trim_logs(logs)
 
         try:
-            log_analysis = log_service.analyze_logs(logs)
-
-            enhanced_context = {
-                "user_context": request.context,
-                "log_analysis": {
-                    "total_entries": log_analysis["total_entries"],
-                    "error_count": log_analysis["error_count"],
-                    "error_rate": log_analysis["summary"]["error_rate"],
-                    "level_distribution": log_analysis["summary"]["level_distribution"],
-                    "detected_errors": [
-                        {
-                            "type": error.error_type,
-                            "message": error.message,
-                            "line_number": error.line_number,
-                            "suggestion": error.suggestion,
-                        }
-                        for error in log_analysis["errors"]
-                    ],
-                },
-            }
+            enhanced_context = await _build_enhanced_context(request, logs)
 
             response = await ai_service.analyze_logs(
-                logs=logs, context=enhanced_context
+                logs=prompt_logs, context=enhanced_context
             )
 
             if not response or not response.content:
@@ -72,10 +99,21 @@ async def debug_logs(request: LogAnalysisRequest):
             return response
 
         except Exception as log_error:
-            response = await ai_service.analyze_logs(logs=logs, context=request.context)
+            response = await ai_service.analyze_logs(
+                logs=prompt_logs, context=request.context
+            )
             return response
 
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze logs: {str(e)}")
+
+
+@router.post("/debug/stream")
+async def stream_debug_logs(
+    request: LogAnalysisRequest, ai_service: AIService = Depends(get_ai_service)
+):
+    logs = await _load_logs(request)
+    events = await _stream_events(request, logs, ai_service)
+    return StreamingResponse(encode_sse(events), media_type="text/event-stream")
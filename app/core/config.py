@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings
 
 
@@ -5,6 +6,15 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/codepilot/v1"
     GEMINI_API_KEY: str
     PROJECT_NAME: str = "VS CodePilot extension"
+    ALLOWED_ORIGINS: list[str] = []
+    ALLOWED_ORIGIN_REGEX: str = (
+        r"https?://(localhost|127\.0\.0\.1)(:\d+)?|vscode-webview://[\w.-]+"
+    )
+    GEMINI_MAX_CONCURRENCY: int = 20
+    GEMINI_MAX_RETRIES: int = 3
+    ENABLE_SEMANTIC_CACHE: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    WEB_CONCURRENCY: int = os.cpu_count() or 1
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,16 @@
+import hashlib
+
+
+def cache_key(data: bytes | str) -> bytes:
+    """
+    Returns a compact digest of `data` for use as an in-memory cache key.
+
+    Args:
+        data (bytes | str): The content to key on; strings are UTF-8 encoded.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.blake2b(data, digest_size=16).digest()
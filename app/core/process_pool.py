@@ -0,0 +1,118 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional
+from app.core.config import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    """
+    Returns the number of worker processes each server process may use.
+
+    The CPUs are shared between the uvicorn workers, so every worker gets its
+    share rather than a pool as large as the machine.
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WEB_CONCURRENCY))
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool for CPU-bound work, creating it on first use.
+
+    Workers are started with the "spawn" method, since forking a server process
+    that already runs gRPC and thread-pool threads can deadlock the child.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=pool_size(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+async def run_in_pool(fn: Callable, *args: Any) -> Any:
+    """
+    Runs `fn(*args)` in the process pool without blocking the event loop.
+
+    A worker that dies (killed, out of memory) breaks the whole pool for good;
+    the broken pool is then dropped and the call is retried once on a new one.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+
+
+def map_in_pool(fn: Callable, items: List) -> Iterator:
+    """
+    Like `ProcessPoolExecutor.map` on the process pool, recovering from a broken pool.
+
+    All items are submitted before this returns, so the caller can do other work
+    while they run. If the pool breaks, the items without a result are retried
+    once on a new pool.
+    """
+    pool = get_process_pool()
+    try:
+        results = pool.map(fn, items)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        return _map_retry(fn, items)
+    return _map_results(pool, results, fn, items)
+
+
+def _map_results(
+    pool: ProcessPoolExecutor, results: Iterator, fn: Callable, items: List
+) -> Iterator:
+    done = 0
+    try:
+        for result in results:
+            yield result
+            done += 1
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        yield from _map_retry(fn, items[done:])
+
+
+def _map_retry(fn: Callable, items: List) -> Iterator:
+    pool = get_process_pool()
+    try:
+        yield from pool.map(fn, items)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drops a broken pool, unless another caller has already replaced it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_process_pool() -> None:
+    """
+    Shuts down the process pool, if it was ever created.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
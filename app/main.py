@@ -1,7 +1,8 @@
 import uvicorn
 from app import create_app
+from app.core.config import settings
 
 app=create_app()
 
 if __name__=="__main__":
-    uvicorn.run("app.main:app",port=8000,reload=True,workers=True)
\ No newline at end of file
+    uvicorn.run("app.main:app",port=8000,workers=settings.WEB_CONCURRENCY)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True)
+class LogEntry:
+    """
+    A single parsed log line.
+
+    This is a slotted dataclass rather than a pydantic model, because one is
+    built for every line of a log and its fields come from our own parsing.
+    """
+
+    timestamp: Optional[str]
+    content: str
+    level: str
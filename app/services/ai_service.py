@@ -1,26 +1,120 @@
+import asyncio
+import functools
 import logging
-from typing import Optional
+import re
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from cachetools import TTLCache
 from fastapi import HTTPException
-import google.generativeai as genai
 from app.core.config import settings
+from app.core.hashing import cache_key
 from app.models.ai_response import AIResponse
+from app.services.semantic_cache import SemanticCache
+from app.services.streaming import CodeBlockExtractor
+
+_SUGGESTION_RE = re.compile(
+    r"^[^\S\n]*(?:\d+\.(.*\S)|[•*-](.*)"
+    r"|(.*(?:suggest|recommend|consider|could|should|try).*))[^\S\n]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_CHAT_CONTEXT_RE = re.compile(
+    r"^.*(?:important|key|critical|note|recommendation).*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_CODE_BLOCK_RE = re.compile(r"^```([^\n]*)\n(.*?)(?:^```|\Z)", re.MULTILINE | re.DOTALL)
+
+# Static prompt fragments. Instructions come before the user's code and logs so
+# every prompt of a kind starts with the same bytes, which lets Gemini reuse its
+# prefix cache; the builders join them so large payloads are copied only once.
+_CODE_ROLE = (
+    "You are an expert code analyzer focusing on API debugging and optimization.\n\n"
+)
+_CODE_TASKS = (
+    "Default Analysis Tasks:\n"
+    "1. Code structure insights\n"
+    "2. Potential improvements\n"
+    "3. Best practices recommendations\n"
+    "4. Specific code quality suggestions\n\n"
+)
+_CODE_INTRO = "Analyze the following code:\n```\n"
+_LOG_ROLE = "You are an expert in debugging API logs and identifying issues.\n\n"
+_LOG_TASKS = (
+    "Analysis Tasks:\n"
+    "1. Potential root causes\n"
+    "2. Specific debugging steps\n"
+    "3. Recommended fixes\n"
+    "4. Best practices to prevent similar issues\n"
+    "5. Provide updated code to address the issue\n\n"
+)
+_LOG_INTRO = "Analyze the following logs:\n```\n"
+_LOG_USER_TAIL = "\n\nBased on the code and logs, give updated code."
+_USER_PROMPT = "Consider this user prompt: "
+
+# google.generativeai pulls in grpc and protobuf, so it is imported on first use
+# rather than at worker start; see `_get_genai` and `_get_model`.
+genai = None
+_MODEL = None
+_init_lock = threading.Lock()
+
+
+def _get_genai():
+    """Imports and configures google.generativeai once per process."""
+    global genai
+    if genai is None:
+        with _init_lock:
+            if genai is None:
+                import google.generativeai as _genai
+
+                _genai.configure(api_key=settings.GEMINI_API_KEY)
+                genai = _genai
+    return genai
+
+
+def _get_model():
+    """Returns the process-wide Gemini model, creating it on first use."""
+    global _MODEL
+    if _MODEL is None:
+        model = _get_genai().GenerativeModel("gemini-pro")
+        with _init_lock:
+            if _MODEL is None:
+                _MODEL = model
+    return _MODEL
 
 
 class AIService:
+    # Chunks a stream may buffer ahead of its client; a full Gemini response
+    # fits, so the upstream call can finish and free its slot.
+    STREAM_BUFFER_CHUNKS = 256
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel("gemini-pro")
+        self.model = _get_model()
+        self._cache: TTLCache = TTLCache(maxsize=512, ttl=600)
+        self._inflight: Dict[bytes, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+        self._semantic_cache = (
+            SemanticCache(self._embed, threshold=settings.SEMANTIC_CACHE_THRESHOLD)
+            if settings.ENABLE_SEMANTIC_CACHE
+            else None
+        )
+
+    async def aclose(self) -> None:
+        """
+        Releases the shared Gemini channel at application shutdown.
+        """
+        client = getattr(self.model, "_async_client", None)
+        if client is not None:
+            await client.transport.close()
 
     async def analyze_code(
-        self, code: str, context: str = None, user_prompt: str = None
+        self, code: str, context: str | dict = None, user_prompt: str = None
     ) -> AIResponse:
         try:
+            context = self._normalize_context(context)
             prompt = self._build_code_analysis_prompt(code, context, user_prompt)
-            response = await self.model.generate_content_async(prompt)
-            return self._parse_ai_response(response)
+            return await self._generate(prompt)
         except Exception as e:
-            self.logger.error(f"Error analyzing code: {str(e)}")
+            self.logger.error("Error analyzing code: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
 
     async def analyze_logs(
@@ -31,47 +125,247 @@ class AIService:
         code: str = None,
     ) -> AIResponse:
         try:
-            if isinstance(logs, list):
-                logs = "\n".join(logs)
-            if isinstance(context, (dict, list)):
-                context = ", ".join(
-                    [f"{k}: {v}" for k, v in context.items()]
-                    if isinstance(context, dict)
-                    else [str(item) for item in context]
-                )
+            logs, context = self._normalize_inputs(logs, context)
             prompt = self._build_log_analysis_prompt(logs, context, user_prompt, code)
-            response = await self.model.generate_content_async(prompt)
-            return self._parse_ai_response(response)
+            return await self._generate(prompt)
         except Exception as e:
-            self.logger.error(f"Error analyzing logs: {str(e)}")
+            self.logger.error("Error analyzing logs: %s", e)
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def analyze_code_batch(
+        self, items: List[Dict[str, Any]]
+    ) -> List[AIResponse | Exception]:
+        """
+        Analyzes several pieces of code concurrently.
+
+        Args:
+            items (List[Dict[str, Any]]): Keyword arguments for `analyze_code`, one
+                dict per analysis.
+
+        Returns:
+            List[AIResponse | Exception]: One result per item, in order. A failed
+            analysis yields its HTTPException instead of failing the whole batch.
+        """
+        return await asyncio.gather(
+            *(self.analyze_code(**item) for item in items), return_exceptions=True
+        )
+
+    async def analyze_logs_batch(
+        self, items: List[Dict[str, Any]]
+    ) -> List[AIResponse | Exception]:
+        """
+        Analyzes several sets of logs concurrently.
+
+        Args:
+            items (List[Dict[str, Any]]): Keyword arguments for `analyze_logs`, one
+                dict per analysis.
+
+        Returns:
+            List[AIResponse | Exception]: One result per item, in order. A failed
+            analysis yields its HTTPException instead of failing the whole batch.
+        """
+        return await asyncio.gather(
+            *(self.analyze_logs(**item) for item in items), return_exceptions=True
+        )
+
+    def stream_analyze_code(
+        self, code: str, context: str | dict = None, user_prompt: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams a code analysis as it is generated.
+
+        The prompt is built eagerly, so invalid input raises here rather than
+        mid-stream. See `_stream` for the events produced.
+        """
+        context = self._normalize_context(context)
+        prompt = self._build_code_analysis_prompt(code, context, user_prompt)
+        return self._stream(prompt)
+
+    def stream_analyze_logs(
+        self,
+        logs: str | list,
+        context: str | list | dict = None,
+        user_prompt: str = None,
+        code: str = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams a log analysis as it is generated.
+
+        The prompt is built eagerly, so invalid input raises here rather than
+        mid-stream. See `_stream` for the events produced.
+        """
+        logs, context = self._normalize_inputs(logs, context)
+        prompt = self._build_log_analysis_prompt(logs, context, user_prompt, code)
+        return self._stream(prompt)
+
+    @staticmethod
+    def _normalize_inputs(
+        logs: str | list, context: str | list | dict = None
+    ) -> Tuple[str, Optional[str]]:
+        if isinstance(logs, list):
+            logs = "\n".join(logs)
+        return logs, AIService._normalize_context(context)
+
+    @staticmethod
+    def _normalize_context(context: str | list | dict = None) -> Optional[str]:
+        if isinstance(context, dict):
+            return ", ".join(f"{k}: {v}" for k, v in context.items())
+        if isinstance(context, list):
+            return ", ".join(map(str, context))
+        return context
+
+    async def _generate(self, prompt: str) -> AIResponse:
+        """
+        Returns the AI response for a prompt, serving repeated prompts from cache.
+
+        Concurrent requests for the same prompt share a single upstream call.
+        """
+        key = cache_key(prompt)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, prompt))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: bytes, prompt: str) -> AIResponse:
+        try:
+            vector = None
+            if self._semantic_cache is not None:
+                vector, result = await self._semantic_lookup(prompt)
+                if result is not None:
+                    self._cache[key] = result
+                    return result
+            response = await self._call_model(prompt)
+            result = self._parse_ai_response(response.text)
+            self._cache[key] = result
+            if vector is not None:
+                self._semantic_cache.store(vector, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _semantic_lookup(
+        self, prompt: str
+    ) -> Tuple[Optional[list], Optional[AIResponse]]:
+        """
+        Looks up a response for a similar earlier prompt.
+
+        Embedding failures are logged and treated as a miss, so the semantic
+        cache never fails a request on its own.
+        """
+        try:
+            return await self._semantic_cache.lookup(prompt)
+        except Exception as e:
+            self.logger.warning("Semantic cache lookup failed: %s", e)
+            return None, None
+
+    async def _embed(self, prompt: str) -> list:
+        result = await _get_genai().embed_content_async(
+            model="models/embedding-001",
+            content=prompt,
+            task_type="semantic_similarity",
+        )
+        return result["embedding"]
+
+    async def _call_model(self, prompt: str):
+        """
+        Calls Gemini with at most GEMINI_MAX_CONCURRENCY requests in flight.
+
+        Rate-limit errors are retried with exponential backoff, up to
+        GEMINI_MAX_RETRIES times.
+        """
+        from google.api_core.exceptions import ResourceExhausted
+
+        for attempt in range(settings.GEMINI_MAX_RETRIES):
+            try:
+                async with self._semaphore:
+                    return await self.model.generate_content_async(prompt)
+            except ResourceExhausted:
+                delay = 0.5 * 2**attempt
+                self.logger.warning("Gemini rate limit hit, retrying in %.1fs", delay)
+                await asyncio.sleep(delay)
+        async with self._semaphore:
+            return await self.model.generate_content_async(prompt)
+
+    async def _stream(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields response events for a prompt while Gemini is still generating.
+
+        Emits "text" events with each chunk, "snippet" events as code blocks
+        close, and a final "done" event carrying the full AIResponse. Failures
+        after the stream has started are reported as an "error" event.
+        """
+        key = cache_key(prompt)
+        result = self._cache.get(key)
+        if result is not None:
+            yield {"event": "text", "data": result.content}
+            for snippet in result.code_snippets or []:
+                yield {"event": "snippet", "data": snippet}
+            yield {"event": "done", "data": result.model_dump()}
+            return
+
+        # The reader holds a concurrency slot for the whole upstream stream and
+        # buffers the chunks, so a slow client does not keep the slot pinned.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.STREAM_BUFFER_CHUNKS)
+        reader = asyncio.ensure_future(self._read_stream(prompt, queue))
+        extractor = CodeBlockExtractor()
+        chunks = []
+        try:
+            while True:
+                text = await queue.get()
+                if text is None:
+                    break
+                if isinstance(text, Exception):
+                    raise text
+                chunks.append(text)
+                yield {"event": "text", "data": text}
+                for snippet in extractor.feed(text):
+                    yield {"event": "snippet", "data": snippet}
+        except Exception as e:
+            self.logger.error("Error streaming AI response: %s", e)
+            yield {"event": "error", "data": str(e)}
+            return
+        finally:
+            reader.cancel()
+        for snippet in extractor.close():
+            yield {"event": "snippet", "data": snippet}
+
+        result = self._parse_ai_response("".join(chunks))
+        self._cache[key] = result
+        yield {"event": "done", "data": result.model_dump()}
+
+    async def _read_stream(self, prompt: str, queue: asyncio.Queue) -> None:
+        """
+        Puts the text of each Gemini stream chunk on `queue`, then None.
+
+        An exception that stops the stream is put on the queue in place of None.
+        """
+        try:
+            async with self._semaphore:
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    await queue.put(chunk.text)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+
     def _build_code_analysis_prompt(
         self, code: str, context: str = None, user_prompt: str = None
     ) -> str:
-        base_prompt = f"""
-        You are an expert code analyzer focusing on API debugging and optimization.
-        Analyze the following code:
-        ```
-        {code}
-        ```
-        {"Context: " + context if context else ""}
-        
-        Default Analysis Tasks:
-        1. Code structure insights
-        2. Potential improvements
-        3. Best practices recommendations
-        4. Specific code quality suggestions
-        """
+        parts = [_CODE_ROLE]
         if user_prompt:
-            return f"""You are an expert consider this user prompt: {user_prompt}
-            analyze the following code:
-            ```
-            {code}
-            ```
-            {"Context: " + context if context else ""}
-            """
-        return base_prompt.strip()
+            parts += (_USER_PROMPT, user_prompt, "\n\n")
+        else:
+            parts.append(_CODE_TASKS)
+        parts += (_CODE_INTRO, code, "\n```")
+        if context:
+            parts += ("\n\nContext: ", context)
+        return "".join(parts)
 
     def _build_log_analysis_prompt(
         self,
@@ -83,44 +377,23 @@ class AIService:
         """
         Build prompt for log analysis with caching for repeated requests.
         """
+        parts = [_LOG_ROLE]
         if user_prompt:
-            prompt = f"""You are an expert log analyzer. Consider this user prompt: {user_prompt}
-            
-            Analyze the following logs:
-            ```
-            {logs}
-            ```
-            """
-            if code:
-                prompt += f"\nRelated code:\n```\n{code}\n```"
-            if context:
-                prompt += f"\nContext: {context}"
-            prompt += "based on code and logs give updated code"
-            return prompt
-        prompt = f"""
-        You are an expert in debugging API logs and identifying issues.
-        
-        Analyze the following logs:
-        ```
-        {logs}
-        ```
-        
-        Analysis Tasks:
-        1. Potential root causes
-        2. Specific debugging steps
-        3. Recommended fixes
-        4. Best practices to prevent similar issues
-        5. Provide updated code to address the issue
-        """.strip()
+            parts += (_USER_PROMPT, user_prompt, "\n\n")
+        else:
+            parts.append(_LOG_TASKS)
+        parts += (_LOG_INTRO, logs, "\n```")
         if code:
-            prompt += f"\n\nRelated code:\n```\n{code}\n```"
+            parts += ("\n\nRelated code:\n```\n", code, "\n```")
         if context:
-            prompt += f"\n\nContext: {context}"
-        return prompt
+            parts += ("\n\nContext: ", context)
+        if user_prompt:
+            parts.append(_LOG_USER_TAIL)
+        return "".join(parts)
 
-    def _parse_ai_response(self, response) -> AIResponse:
-        content = response.text
-        return AIResponse(
+    def _parse_ai_response(self, content: str) -> AIResponse:
+        # Every field is produced here from the model's text, so skip re-validation.
+        return AIResponse.model_construct(
             content=content,
             suggestions=self._extract_suggestions(content),
             code_snippets=self._extract_code_snippets(content),
@@ -131,20 +404,9 @@ class AIService:
         """
         Extracts relevant context from the response that might be useful for future interactions.
         """
-        key_points = []
-        lines = content.split("\n")
-        for line in lines:
-            if any(
-                keyword in line.lower()
-                for keyword in [
-                    "important",
-                    "key",
-                    "critical",
-                    "note",
-                    "recommendation",
-                ]
-            ):
-                key_points.append(line.strip())
+        key_points = [
+            match.group(0).strip() for match in _CHAT_CONTEXT_RE.finditer(content)
+        ]
         return "\n".join(key_points) if key_points else None
 
     def _extract_suggestions(self, content: str) -> list:
@@ -152,67 +414,29 @@ class AIService:
         Extracts suggestions from the AI response content.
         Looks for numbered/bulleted items and lines containing keywords like 'suggest', 'recommend', 'consider'.
         """
-        suggestions = []
-        lines = content.split("\n")
-        suggestion_keywords = [
-            "suggest",
-            "recommend",
-            "consider",
-            "could",
-            "should",
-            "try",
+        return [
+            match.group(match.lastindex).strip()
+            for match in _SUGGESTION_RE.finditer(content)
         ]
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                continue
-            if line[0].isdigit() and len(line) > 2 and line[1] == ".":
-                suggestions.append(line[2:].strip())
-                continue
-            if line.startswith(("•", "-", "*")):
-                suggestions.append(line[1:].strip())
-                continue
-            if any(keyword in line.lower() for keyword in suggestion_keywords):
-                suggestions.append(line)
-        return suggestions
 
     def _extract_code_snippets(self, content: str) -> list:
         """
         Extracts code snippets from the AI response content.
         Returns a list of dictionaries containing code and its language.
         """
-        snippets = []
-        lines = content.split("\n")
-        current_snippet = []
-        current_language = None
-        in_code_block = False
-
-        for line in lines:
-            if line.startswith("```"):
-                if in_code_block:
-                    if current_snippet:
-                        snippets.append(
-                            {
-                                "code": "\n".join(current_snippet),
-                                "language": current_language or "text",
-                            }
-                        )
-                    current_snippet = []
-                    current_language = None
-                    in_code_block = False
-                else:
-                    in_code_block = True
-                    language_spec = line[3:].strip()
-                    if language_spec:
-                        current_language = language_spec.lower()
-                continue
-            if in_code_block:
-                current_snippet.append(line)
-        if current_snippet:
-            snippets.append(
-                {
-                    "code": "\n".join(current_snippet),
-                    "language": current_language or "text",
-                }
-            )
-        return snippets
+        if "```" not in content:
+            return []
+        return [
+            {
+                "code": code[:-1] if code.endswith("\n") else code,
+                "language": language.strip().lower() or "text",
+            }
+            for language, code in _CODE_BLOCK_RE.findall(content)
+            if code
+        ]
+
+
+@functools.lru_cache(maxsize=1)
+def get_ai_service() -> AIService:
+    """Returns the process-wide AIService shared by all endpoints."""
+    return AIService()
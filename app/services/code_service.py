@@ -1,6 +1,93 @@
 import re
 import ast
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+import black
+from cachetools import LRUCache
+from app.core.hashing import cache_key
+
+_SEMICOLON_AFTER_RE = re.compile(r"\s*;\s*")
+_SEMICOLON_BEFORE_RE = re.compile(r"\s*;\s*$")
+_BLACK_MODE = black.Mode()
+# Parsed trees and formatted sources, keyed on the source digest only.
+_tree_cache: LRUCache = LRUCache(maxsize=64)
+_format_cache: LRUCache = LRUCache(maxsize=64)
+
+
+def _statements(tree: ast.Module) -> List[str]:
+    """
+    Dumps the module-level statements of `tree` other than imports, for comparison.
+    """
+    return [
+        ast.dump(node)
+        for node in tree.body
+        if not isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+def _parse_cached(code: str) -> ast.AST:
+    key = cache_key(code)
+    tree = _tree_cache.get(key)
+    if tree is None:
+        tree = _tree_cache[key] = ast.parse(code)
+    return tree
+
+
+def _format_cached(code: str) -> str:
+    key = cache_key(code)
+    formatted = _format_cache.get(key)
+    if formatted is None:
+        try:
+            formatted = black.format_str(code, mode=_BLACK_MODE)
+        except black.InvalidInput:
+            formatted = ast.unparse(_parse_cached(code))
+        _format_cache[key] = formatted
+    return formatted
+
+
+class _StructureVisitor(ast.NodeVisitor):
+    """
+    Collects imports, functions and classes in one walk over a module.
+
+    A class's direct methods are reported through its method count rather than as
+    functions, but their bodies and the rest of the class body are still walked.
+    """
+
+    def __init__(self, analysis: Dict[str, Any]):
+        self.analysis = analysis
+
+    def visit_Import(self, node: ast.Import) -> None:
+        self.analysis["imports"].extend(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        self.analysis["imports"].extend(
+            f"{node.module}.{alias.name}" for alias in node.names
+        )
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        args = len(node.args.args)
+        self.analysis["functions"].append(
+            {"name": node.name, "args": args, "line_number": node.lineno}
+        )
+        self.analysis["functions_by_name"][node.name] = {
+            "argument_count": args,
+            "line_number": node.lineno,
+        }
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        methods = sum(1 for n in node.body if isinstance(n, ast.FunctionDef))
+        self.analysis["classes"].append(
+            {"name": node.name, "methods": methods, "line_number": node.lineno}
+        )
+        self.analysis["classes_by_name"][node.name] = {
+            "method_count": methods,
+            "line_number": node.lineno,
+        }
+        for child in node.body:
+            if isinstance(child, ast.FunctionDef):
+                self.generic_visit(child)
+            else:
+                self.visit(child)
 
 
 class CodeService:
@@ -9,6 +96,10 @@ class CodeService:
         """
         Parses a string of Python code into an Abstract Syntax Tree (AST).
 
+        Trees are cached per process by source digest, so the same code is parsed
+        only once across analysis and refactoring. The returned tree is shared and
+        must not be mutated.
+
         Args:
             code (str): A string representing the Python code to parse.
 
@@ -20,7 +111,7 @@ class CodeService:
         """
 
         try:
-            return ast.parse(code)
+            return _parse_cached(code)
         except SyntaxError as e:
             raise Exception(f"Syntax error in code: {str(e)}")
 
@@ -30,6 +121,9 @@ class CodeService:
         Analyzes the structure of an Abstract Syntax Tree (AST) representing Python code.
 
         The analysis includes a count of imports, functions, classes, and the complexity of the code.
+        Methods are counted on their class rather than listed as functions.
+        Functions and classes are also indexed by name under "functions_by_name" and
+        "classes_by_name", in the shape the analysis endpoint reports them.
 
         Args:
             tree (ast.AST): The root of the AST tree representing the Python code to analyze.
@@ -39,34 +133,42 @@ class CodeService:
 
         """
 
-        analysis = {"imports": [], "functions": [], "classes": [], "complexity": 0}
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                analysis["imports"].extend(n.name for n in node.names)
-            elif isinstance(node, ast.ImportFrom):
-                analysis["imports"].append(f"{node.module}.{node.names[0].name}")
-            elif isinstance(node, ast.FunctionDef):
-                analysis["functions"].append(
-                    {
-                        "name": node.name,
-                        "args": len(node.args.args),
-                        "line_number": node.lineno,
-                    }
-                )
-            elif isinstance(node, ast.ClassDef):
-                analysis["classes"].append(
-                    {
-                        "name": node.name,
-                        "methods": len(
-                            [n for n in node.body if isinstance(n, ast.FunctionDef)]
-                        ),
-                        "line_number": node.lineno,
-                    }
-                )
+        analysis = {
+            "imports": [],
+            "functions": [],
+            "classes": [],
+            "complexity": 0,
+            "functions_by_name": {},
+            "classes_by_name": {},
+        }
 
+        _StructureVisitor(analysis).visit(tree)
         return analysis
 
+    @staticmethod
+    def analyze_source(code: str) -> Tuple[Dict[str, Any], str, str]:
+        """
+        Runs the full static analysis pipeline on a piece of Python code.
+
+        Returns only plain data so it can be executed in a worker process.
+
+        Args:
+            code (str): A string representing the Python code to analyze.
+
+        Returns:
+            Tuple[Dict[str, Any], str, str]: The structure analysis, the code with
+            optimized imports, and the formatted version of that code.
+
+        Raises:
+            Exception: If the code cannot be parsed or refactored.
+        """
+
+        tree = CodeService.parse_code(code)
+        analysis = CodeService.analyze_structure(tree)
+        optimized_code = CodeService.refactor_code(code, "optimize_imports")
+        formatted_code = CodeService.refactor_code(optimized_code, "format")
+        return analysis, optimized_code, formatted_code
+
     @staticmethod
     def refactor_code(code: str, refactor_type: str) -> str:
         """
@@ -95,6 +197,9 @@ class CodeService:
         """
         Format the given code according to PEP 8 conventions.
 
+        Uses black, which keeps comments intact, and falls back to an `ast.unparse`
+        round-trip for code black rejects. Results are cached by source digest.
+
         Args:
             code (str): The code to format.
 
@@ -106,8 +211,8 @@ class CodeService:
         """
 
         try:
-            tree = ast.parse(code)
-            return ast.unparse(tree)
+            CodeService.parse_code(code)
+            return _format_cached(code)
         except Exception as e:
             raise Exception(f"Code formatting failed: {str(e)}")
 
@@ -116,6 +221,12 @@ class CodeService:
         """
         Reorders imports in the given code according to PEP 8 conventions.
 
+        Only module-level imports are moved. Each one is cut out by its AST position,
+        so parenthesized multi-line imports are handled as a whole and other
+        statements sharing a line with an import, as in `x = 1; import os`, are kept.
+        If the rewrite would change any other module-level statement, the code is
+        returned unchanged.
+
         Args:
             code (str): The code to reorder imports in.
 
@@ -126,21 +237,34 @@ class CodeService:
             Exception: If code analysis fails.
         """
         try:
-            tree = ast.parse(code)
-            imports = []
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.Import, ast.ImportFrom)):
-                    imports.append(ast.unparse(node))
-
-            imports = sorted(set(imports))
-
-            code_lines = code.split("\n")
-            code_without_imports = [
-                line
-                for line in code_lines
-                if not line.strip().startswith(("import ", "from "))
+            tree = CodeService.parse_code(code)
+            import_nodes = [
+                node
+                for node in tree.body
+                if isinstance(node, (ast.Import, ast.ImportFrom))
             ]
+            imports = sorted({ast.unparse(node) for node in import_nodes})
+
+            lines = code.split("\n")
+            for node in reversed(import_nodes):
+                first = lines[node.lineno - 1].encode()
+                last = lines[node.end_lineno - 1].encode()
+                before = first[: node.col_offset].decode()
+                after = last[node.end_col_offset :].decode()
+                # Drop the `;` that joined the import to a neighbouring statement.
+                if _SEMICOLON_AFTER_RE.match(after):
+                    after = _SEMICOLON_AFTER_RE.sub("", after, count=1)
+                else:
+                    before = _SEMICOLON_BEFORE_RE.sub("", before, count=1)
+                rest = before + after
+                if rest.strip() and not rest.lstrip().startswith("#"):
+                    lines[node.lineno - 1 : node.end_lineno] = [rest]
+                else:
+                    del lines[node.lineno - 1 : node.end_lineno]
 
-            return "\n".join(imports + [""] + code_without_imports)
+            optimized_code = "\n".join(imports + [""] + lines)
+            if _statements(ast.parse(optimized_code)) != _statements(tree):
+                return code
+            return optimized_code
         except Exception as e:
             raise Exception(f"Import optimization failed: {str(e)}")
@@ -1,48 +1,236 @@
 import re
+from collections import deque
+from operator import itemgetter
 from typing import Optional
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Tuple
+from pydantic import TypeAdapter
+from app.core.process_pool import map_in_pool, pool_size
 from app.models.error_details import ErrorDetail
+from app.models.log_entry import LogEntry
+
+_TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_LINE_NUMBER_RE = re.compile(r"line (\d+)")
+_LINE_RE = re.compile(r"[^\n]+")
+# Validates a whole list of errors in one call instead of one model at a time.
+_ERROR_DETAILS = TypeAdapter(List[ErrorDetail])
+
+
+def _iter_entries(logs: str) -> Iterator[LogEntry]:
+    """
+    Yields the parsed entries of `logs`, finding lines with a single regex scan
+    rather than splitting the text first.
+    """
+    for match in _LINE_RE.finditer(logs):
+        entry = _parse_log_line(match.group())
+        if entry is not None:
+            yield entry
+
+
+def _scan_lines(logs: str) -> Tuple[Dict[str, int], List[Dict], bool]:
+    """
+    Counts log levels and builds the timeline of `logs` in one pass over its lines.
+
+    Returns:
+        Tuple[Dict[str, int], List[Dict], bool]: The level counts, the timeline in
+        log order, and whether that order is already sorted by time.
+    """
+    levels = {"ERROR": 0, "WARNING": 0, "INFO": 0, "UNKNOWN": 0}
+    timeline = []
+    last_time = ""
+    in_order = True
+    for entry in _iter_entries(logs):
+        levels[entry.level] += 1
+        timestamp = entry.timestamp
+        if timestamp:
+            timeline.append(
+                {"time": timestamp, "event": entry.content, "level": entry.level}
+            )
+            in_order = in_order and timestamp >= last_time
+            last_time = timestamp
+    return levels, timeline, in_order
+
+
+def _split_lines(logs: str, parts: int) -> List[str]:
+    """
+    Splits `logs` into about `parts` chunks of whole lines.
+    """
+    size = len(logs) // parts + 1
+    chunks = []
+    start = 0
+    while start < len(logs):
+        end = logs.find("\n", start + size)
+        if end == -1:
+            end = len(logs)
+        chunks.append(logs[start:end])
+        start = end + 1
+    return chunks
+
+
+def _combine_error_patterns(
+    patterns: Dict[str, Tuple[str, ...]],
+) -> Tuple[re.Pattern, Dict[int, str]]:
+    """
+    Compiles all error patterns into one top-level alternation.
+
+    Each alternative is followed by an empty marker group. The marker closes after
+    any groups inside the pattern, so it is always `match.lastindex`.
+
+    Args:
+        patterns (Dict[str, Tuple[str, ...]]): Alternative patterns per error type.
+
+    Returns:
+        Tuple[re.Pattern, Dict[int, str]]: The combined regex, and the error type
+        for each marker group index.
+    """
+    alternatives = []
+    types = {}
+    groups = 0
+    for error_type, type_patterns in patterns.items():
+        for pattern in type_patterns:
+            groups += re.compile(pattern).groups + 1
+            alternatives.append(f"{pattern}()")
+            types[groups] = error_type
+    return re.compile("|".join(alternatives), re.MULTILINE), types
+
+
+def _parse_log_line(line: str) -> Optional[LogEntry]:
+    """
+    Parses a single log line and returns a LogEntry holding its timestamp, content, and level.
+
+    Args:
+        line (str): A single line of the log data.
+
+    Returns:
+        Optional[LogEntry]: The parsed log entry, or None if the line is blank.
+    """
+
+    content = line.strip()
+    if not content:
+        return None
+    timestamp_match = _TIMESTAMP_RE.search(line)
+
+    return LogEntry(
+        timestamp_match.group(0) if timestamp_match else None,
+        content,
+        _detect_log_level(line),
+    )
+
+
+def _detect_log_level(line: str) -> str:
+    """
+    Detects the log level of a given log line.
+
+    Args:
+        line (str): A single line of the log data.
+
+    Returns:
+        str: The log level of the given log line, which can be "ERROR", "WARNING", "INFO", or "UNKNOWN".
+    """
+
+    line = line.upper()
+    if "ERROR" in line:
+        return "ERROR"
+    elif "WARNING" in line:
+        return "WARNING"
+    elif "INFO" in line:
+        return "INFO"
+    return "UNKNOWN"
+
+
+def _extract_line_number(error_text: str) -> Optional[int]:
+    """
+    Extracts the line number from the given error text, if available.
+
+    Args:
+        error_text (str): The error text to parse.
+
+    Returns:
+        Optional[int]: The line number where the error occurred, if found. Otherwise, None.
+    """
+    line_match = _LINE_NUMBER_RE.search(error_text)
+    return int(line_match.group(1)) if line_match else None
+
+
+def _generate_suggestion(error_type: str, error_text: str) -> str:
+    """
+    Generates a suggestion for fixing the given error based on the error type and text.
+
+    Args:
+        error_type (str): The type of error.
+        error_text (str): The error text.
+
+    Returns:
+        str: A suggestion for fixing the given error.
+    """
+
+    if "ImportError" in error_text:
+        return "Check if the required package is installed and accessible"
+    elif "SyntaxError" in error_text:
+        return "Review the code syntax at the indicated line"
+    elif "TypeError" in error_text:
+        return "Verify the data types of the variables being used"
+    return "Review the error message and surrounding code context"
 
 
 class LogService:
+    # Error type -> alternative patterns. Each alternative starts with a literal
+    # character, so the regex engine can skip ahead to candidate positions in the
+    # combined scan; an alternation inside a group would lose that.
     ERROR_PATTERNS = {
-        "python": r"Traceback \(most recent call last\):[\s\S]+?\n\w+Error: .+",
-        "javascript": r"(?:TypeError|ReferenceError|SyntaxError):.+",
-        "api": r"(?:4\d{2}|5\d{2}) (?:Error|NOT_FOUND|BAD_REQUEST):.+",
+        # A traceback runs over its indented frame lines up to the exception line,
+        # which may be a dotted name without a message, e.g. KeyboardInterrupt.
+        "python": (
+            r"Traceback \(most recent call last\):(?:\n[ \t].*)*\n[\w.]+(?:: .+)?$",
+        ),
+        "javascript": (r"TypeError:.+", r"ReferenceError:.+", r"SyntaxError:.+"),
+        "api": (
+            r"4\d{2} (?:Error|NOT_FOUND|BAD_REQUEST):.+",
+            r"5\d{2} (?:Error|NOT_FOUND|BAD_REQUEST):.+",
+        ),
     }
+    _ERROR_RE, _ERROR_TYPES = _combine_error_patterns(ERROR_PATTERNS)
+    # Every error pattern requires one of these substrings to match.
+    _ERROR_MARKERS = ("Traceback", "Error:", "NOT_FOUND:", "BAD_REQUEST:")
+    MAX_PROMPT_LOG_CHARS = 256 * 1024
+    MAX_PROMPT_LOG_LINES = 2000
+    MAX_PROMPT_ERRORS = 50
+    MAX_PROMPT_ERROR_CHARS = 2000
+    PARALLEL_MIN_CHARS = 1024 * 1024
 
     @staticmethod
-    def parse_logs(logs: str) -> List[Dict]:
+    def parse_logs(logs: str) -> List[LogEntry]:
         """
-        Parses a string containing log data into a list of dictionaries.
+        Parses a string containing log data into a list of LogEntry objects.
 
         Each line of the log string is parsed to extract relevant information
-        such as timestamp, content, and log level, which are stored in a dictionary.
-        These dictionaries are then collected into a list representing all log entries.
+        such as timestamp, content, and log level, which are stored in a LogEntry.
+        These entries are then collected into a list representing all log entries.
 
         Args:
             logs (str): A string containing the log data, with each line representing a log entry.
 
         Returns:
-            List[Dict]: A list of dictionaries, each representing a parsed log entry.
+            List[LogEntry]: A list of parsed log entries.
+        """
+
+        return list(_iter_entries(logs))
 
-        Raises:
-            Exception: If parsing of the logs fails.
+    @staticmethod
+    def parse_logs_stream(lines: Iterable[str]) -> Iterator[LogEntry]:
         """
+        Lazily parses log lines, such as those of an open log file, into LogEntry objects.
 
-        try:
-            log_entries = []
-            lines = logs.split("\n")
+        Args:
+            lines (Iterable[str]): The log lines; blank lines are skipped.
 
-            for line in lines:
-                if line.strip():
-                    entry = LogService._parse_log_line(line)
-                    if entry:
-                        log_entries.append(entry)
+        Yields:
+            LogEntry: One parsed log entry per non-blank line.
+        """
 
-            return log_entries
-        except Exception as e:
-            raise Exception(f"Log parsing failed: {str(e)}")
+        for line in lines:
+            entry = _parse_log_line(line)
+            if entry is not None:
+                yield entry
 
     @staticmethod
     def analyze_logs(logs: str) -> Dict:
@@ -51,33 +239,57 @@ class LogService:
 
         - total_entries: The total number of log entries.
         - error_count: The number of error log entries.
-        - errors: A list of dictionaries, each describing an error log entry.
+        - errors: A list of dictionaries, each describing an error log entry with the
+          keys "type", "message", "line_number" and "suggestion".
         - timeline: A list of dictionaries, each representing a log entry with a timestamp.
         - summary: A dictionary with information about the log, such as the distribution of log levels.
 
+        Entries, level counts and the timeline are gathered in one pass over the lines;
+        errors come from a scan of the whole text, since tracebacks span several lines.
+        Logs longer than PARALLEL_MIN_CHARS have their lines split across worker
+        processes, while the error scan runs here in the meantime.
+
         Args:
             logs (str): A string containing the log data, with each line representing a log entry.
 
         Returns:
             Dict: A dictionary containing the analysis of the log data.
-
-        Raises:
-            Exception: If analysis of the logs fails.
         """
 
-        try:
-            parsed_logs = LogService.parse_logs(logs)
-            errors = LogService.extract_errors(logs)
+        workers = pool_size()
+        if workers > 1 and len(logs) > LogService.PARALLEL_MIN_CHARS:
+            chunks = _split_lines(logs, workers)
+            scans = map_in_pool(_scan_lines, chunks)
+            errors = LogService._find_errors(logs)
+            levels, timeline, in_order = next(scans)
+            for chunk_levels, chunk_timeline, chunk_in_order in scans:
+                for level, count in chunk_levels.items():
+                    levels[level] += count
+                in_order = in_order and chunk_in_order
+                if timeline and chunk_timeline:
+                    in_order = in_order and (
+                        chunk_timeline[0]["time"] >= timeline[-1]["time"]
+                    )
+                timeline += chunk_timeline
+        else:
+            levels, timeline, in_order = _scan_lines(logs)
+            errors = LogService._find_errors(logs)
+        # Logs are usually written in time order, in which case the sort is skipped.
+        if not in_order:
+            timeline.sort(key=itemgetter("time"))
+        total_entries = sum(levels.values())
 
-            return {
-                "total_entries": len(parsed_logs),
-                "error_count": len(errors),
-                "errors": errors,
-                "timeline": LogService._create_timeline(parsed_logs),
-                "summary": LogService._create_summary(parsed_logs),
-            }
-        except Exception as e:
-            raise Exception(f"Log analysis failed: {str(e)}")
+        return {
+            "total_entries": total_entries,
+            "error_count": len(errors),
+            "errors": errors,
+            "timeline": timeline,
+            "summary": {
+                "total_logs": total_entries,
+                "level_distribution": levels,
+                "error_rate": levels["ERROR"] / total_entries if total_entries else 0,
+            },
+        }
 
     @staticmethod
     def extract_errors(logs: str) -> List[ErrorDetail]:
@@ -89,150 +301,94 @@ class LogService:
 
         Returns:
             List[ErrorDetail]: A list of ErrorDetail objects, each describing an error log entry.
-
-        Raises:
-            Exception: If extraction of errors from the logs fails.
         """
 
-        errors = []
-        for error_type, pattern in LogService.ERROR_PATTERNS.items():
-            matches = re.finditer(pattern, logs, re.MULTILINE)
-            for match in matches:
-                error_text = match.group(0)
-                errors.append(
-                    ErrorDetail(
-                        error_type=error_type,
-                        message=error_text,
-                        line_number=LogService._extract_line_number(error_text),
-                        suggestion=LogService._generate_suggestion(
-                            error_type, error_text
-                        ),
-                    )
-                )
-        return errors
+        return _ERROR_DETAILS.validate_python(
+            [
+                {
+                    "error_type": error["type"],
+                    "message": error["message"],
+                    "line_number": error["line_number"],
+                    "suggestion": error["suggestion"],
+                }
+                for error in LogService._find_errors(logs)
+            ]
+        )
 
     @staticmethod
-    def _parse_log_line(line: str) -> Dict:
+    def _find_errors(logs: str) -> List[Dict]:
         """
-        Parses a single log line and returns a dictionary containing the log entry's timestamp, content, and level.
+        Finds errors in a string containing log data.
 
         Args:
-            line (str): A single line of the log data.
+            logs (str): A string containing the log data, with each line representing a log entry.
 
         Returns:
-            Dict: A dictionary containing the parsed log entry's timestamp, content, and level.
-
-        Raises:
-            Exception: If parsing of the log line fails.
+            List[Dict]: A list of dictionaries with the keys "type", "message",
+            "line_number" and "suggestion", one per error found, in log order.
         """
 
-        timestamp_pattern = r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}"
-        timestamp_match = re.search(timestamp_pattern, line)
-
-        return {
-            "timestamp": timestamp_match.group(0) if timestamp_match else None,
-            "content": line.strip(),
-            "level": LogService._detect_log_level(line),
-        }
-
-    @staticmethod
-    def _detect_log_level(line: str) -> str:
-        """
-        Detects the log level of a given log line.
+        if not any(marker in logs for marker in LogService._ERROR_MARKERS):
+            return []
 
-        Args:
-            line (str): A single line of the log data.
-
-        Returns:
-            str: The log level of the given log line, which can be "ERROR", "WARNING", "INFO", or "UNKNOWN".
-        """
-
-        line = line.upper()
-        if "ERROR" in line:
-            return "ERROR"
-        elif "WARNING" in line:
-            return "WARNING"
-        elif "INFO" in line:
-            return "INFO"
-        return "UNKNOWN"
+        errors = []
+        for match in LogService._ERROR_RE.finditer(logs):
+            error_type = LogService._ERROR_TYPES[match.lastindex]
+            error_text = match.group(0)
+            errors.append(
+                {
+                    "type": error_type,
+                    "message": error_text,
+                    "line_number": _extract_line_number(error_text),
+                    "suggestion": _generate_suggestion(error_type, error_text),
+                }
+            )
+        return errors
 
     @staticmethod
-    def _extract_line_number(error_text: str) -> Optional[int]:
+    def trim_logs(logs: str) -> str:
         """
-        Extracts the line number from the given error text, if available.
+        Trims log data to the portion worth sending to the AI model.
 
-        Args:
-            error_text (str): The error text to parse.
-
-        Returns:
-            Optional[int]: The line number where the error occurred, if found. Otherwise, None.
-        """
-        line_match = re.search(r"line (\d+)", error_text)
-        return int(line_match.group(1)) if line_match else None
-
-    @staticmethod
-    def _generate_suggestion(error_type: str, error_text: str) -> str:
-        """
-        Generates a suggestion for fixing the given error based on the error type and text.
+        Logs up to MAX_PROMPT_LOG_CHARS long are returned unchanged. Longer logs keep
+        only their last complete lines, at most MAX_PROMPT_LOG_LINES of them, since
+        the most recent output is where failures surface.
 
         Args:
-            error_type (str): The type of error.
-            error_text (str): The error text.
+            logs (str): A string containing the log data.
 
         Returns:
-            str: A suggestion for fixing the given error.
+            str: The log data to include in the prompt.
         """
 
-        if "ImportError" in error_text:
-            return "Check if the required package is installed and accessible"
-        elif "SyntaxError" in error_text:
-            return "Review the code syntax at the indicated line"
-        elif "TypeError" in error_text:
-            return "Verify the data types of the variables being used"
-        return "Review the error message and surrounding code context"
+        if len(logs) <= LogService.MAX_PROMPT_LOG_CHARS:
+            return logs
+        tail = logs[-LogService.MAX_PROMPT_LOG_CHARS :]
+        tail = tail[tail.find("\n") + 1 :]
+        return "\n".join(
+            deque(tail.splitlines(), maxlen=LogService.MAX_PROMPT_LOG_LINES)
+        )
 
     @staticmethod
-    def _create_timeline(parsed_logs: List[Dict]) -> List[Dict]:
-        """
-        Creates a timeline of log events, sorted by timestamp.
-
-        Args:
-            parsed_logs (List[Dict]): A list of dictionaries containing log information.
-
-        Returns:
-            List[Dict]: A list of dictionaries containing the log event, its timestamp, and level.
+    def trim_errors(errors: List[Dict]) -> List[Dict]:
         """
+        Trims detected errors to the portion worth sending to the AI model.
 
-        timeline = []
-        for log in parsed_logs:
-            if log["timestamp"]:
-                timeline.append(
-                    {
-                        "time": log["timestamp"],
-                        "event": log["content"],
-                        "level": log["level"],
-                    }
-                )
-        return sorted(timeline, key=lambda x: x["time"])
-
-    @staticmethod
-    def _create_summary(parsed_logs: List[Dict]) -> Dict:
-        """
-        Creates a summary of log events, including total logs, level distribution, and error rate.
+        Keeps the last MAX_PROMPT_ERRORS errors, like trim_logs keeps the end of the
+        log. A message longer than MAX_PROMPT_ERROR_CHARS keeps only its end, where a
+        traceback names the exception.
 
         Args:
-            parsed_logs (List[Dict]): A list of dictionaries containing log information.
+            errors (List[Dict]): Errors as returned by analyze_logs, in log order.
 
         Returns:
-            Dict: A dictionary containing the summary of log events.
+            List[Dict]: The errors to include in the prompt.
         """
-        
-        levels = {"ERROR": 0, "WARNING": 0, "INFO": 0, "UNKNOWN": 0}
-        for log in parsed_logs:
-            levels[log["level"]] += 1
 
-        return {
-            "total_logs": len(parsed_logs),
-            "level_distribution": levels,
-            "error_rate": levels["ERROR"] / len(parsed_logs) if parsed_logs else 0,
-        }
+        limit = LogService.MAX_PROMPT_ERROR_CHARS
+        trimmed = []
+        for error in errors[-LogService.MAX_PROMPT_ERRORS :]:
+            if len(error["message"]) > limit:
+                error = {**error, "message": "..." + error["message"][-limit:]}
+            trimmed.append(error)
+        return trimmed
@@ -0,0 +1,58 @@
+import math
+import operator
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+
+class SemanticCache:
+    """
+    Serves responses for prompts that are close in meaning to earlier ones.
+
+    Prompts are embedded by the `embed` callable and compared by cosine
+    similarity against the most recent `maxsize` entries. A lookup hits when
+    the best match scores at least `threshold`.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[Sequence[float]]],
+        threshold: float = 0.95,
+        maxsize: int = 256,
+    ):
+        self._embed = embed
+        self.threshold = threshold
+        self._entries: deque = deque(maxlen=maxsize)
+
+    async def lookup(self, prompt: str) -> Tuple[List[float], Optional[Any]]:
+        """
+        Finds the cached value whose prompt is most similar to `prompt`.
+
+        Args:
+            prompt (str): The prompt to look up.
+
+        Returns:
+            Tuple[List[float], Optional[Any]]: The normalized prompt embedding, to be
+            passed back to `store` on a miss, and the cached value (None on a miss).
+        """
+        vector = self._normalize(await self._embed(prompt))
+        best_score, best_value = self.threshold, None
+        for entry, value in self._entries:
+            score = sum(map(operator.mul, vector, entry))
+            if score >= best_score:
+                best_score, best_value = score, value
+        return vector, best_value
+
+    def store(self, vector: List[float], value: Any) -> None:
+        """
+        Caches a value under an embedding returned by `lookup`.
+
+        Args:
+            vector (List[float]): The normalized prompt embedding.
+            value (Any): The value to serve for similar prompts.
+        """
+        self._entries.append((vector, value))
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> List[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
@@ -0,0 +1,85 @@
+import orjson
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class CodeBlockExtractor:
+    """
+    Incrementally extracts fenced code blocks from streamed AI response text.
+
+    Chunks may be split anywhere, including in the middle of a line or a fence
+    marker, so only complete lines are inspected. Snippets use the same shape as
+    `AIService._extract_code_snippets`.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._language: Optional[str] = None
+        self._lines: Optional[List[str]] = None
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        """
+        Consumes a chunk of text and returns the code blocks it completed.
+
+        Args:
+            text (str): The next chunk of the streamed response.
+
+        Returns:
+            List[Dict[str, str]]: Snippets whose closing fence arrived in this chunk.
+        """
+        *lines, self._pending = (self._pending + text).split("\n")
+        snippets = []
+        for line in lines:
+            snippet = self._feed_line(line)
+            if snippet:
+                snippets.append(snippet)
+        return snippets
+
+    def close(self) -> List[Dict[str, str]]:
+        """
+        Flushes the trailing partial line and any unterminated code block.
+
+        Returns:
+            List[Dict[str, str]]: The remaining snippets, if any.
+        """
+        snippets = []
+        if self._pending:
+            snippet = self._feed_line(self._pending)
+            self._pending = ""
+            if snippet:
+                snippets.append(snippet)
+        if self._lines:
+            snippets.append(self._flush())
+        self._lines = None
+        return snippets
+
+    def _feed_line(self, line: str) -> Optional[Dict[str, str]]:
+        if line.startswith("```"):
+            if self._lines is not None:
+                snippet = self._flush() if self._lines else None
+                self._lines = None
+                return snippet
+            self._lines = []
+            self._language = line[3:].strip().lower() or None
+        elif self._lines is not None:
+            self._lines.append(line)
+        return None
+
+    def _flush(self) -> Dict[str, str]:
+        return {"code": "\n".join(self._lines), "language": self._language or "text"}
+
+
+async def encode_sse(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Formats stream events from `AIService` as server-sent events.
+
+    Args:
+        events (AsyncIterator[Dict[str, Any]]): Events with "event" and "data" keys.
+
+    Yields:
+        bytes: One UTF-8 encoded `text/event-stream` frame per event.
+    """
+    async for event in events:
+        yield b"event: %s\ndata: %s\n\n" % (
+            event["event"].encode(),
+            orjson.dumps(event["data"]),
+        )
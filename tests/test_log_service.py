@@ -0,0 +1,37 @@
+import os
+import unittest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from app.services.log_service import LogService
+
+
+class FindErrorsTest(unittest.TestCase):
+    def test_traceback_does_not_swallow_later_errors(self):
+        logs = (
+            "2024-01-01 10:00:00 ERROR Traceback (most recent call last):\n"
+            '  File "app.py", line 3, in <module>\n'
+            "    main()\n"
+            "KeyboardInterrupt\n"
+            "2024-01-01 10:00:01 ERROR GET /users 404 NOT_FOUND: /users\n"
+            "2024-01-01 10:00:02 ERROR ReferenceError: x is not defined\n"
+            "Traceback (most recent call last):\n"
+            '  File "handlers.py", line 7, in handle\n'
+            "    parse(value)\n"
+            "ValueError: bad\n"
+        )
+
+        errors = LogService._find_errors(logs)
+
+        self.assertEqual(
+            [error["type"] for error in errors],
+            ["python", "api", "javascript", "python"],
+        )
+        self.assertTrue(errors[0]["message"].endswith("KeyboardInterrupt"))
+        self.assertEqual(errors[1]["message"], "404 NOT_FOUND: /users")
+        self.assertEqual(errors[2]["message"], "ReferenceError: x is not defined")
+        self.assertTrue(errors[3]["message"].endswith("ValueError: bad"))
+
+
+if __name__ == "__main__":
+    unittest.main()